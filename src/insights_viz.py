@@ -1,12 +1,24 @@
 import pandas as pd
 import psycopg2
+import matplotlib
+matplotlib.use('Agg')  # Non-interactive backend: plots are only written to files
 import matplotlib.pyplot as plt
 import seaborn as sns
 from dotenv import load_dotenv
 import os
+import io
+import argparse
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 load_dotenv()
 
+plt.ioff()
+matplotlib.rcParams['figure.max_open_warning'] = 0
+matplotlib.rcParams['path.simplify_threshold'] = 1.0
+matplotlib.rcParams['agg.path.chunksize'] = 10000
+
 # Configuration 
 DB_PARAMS = {
     "host": os.getenv("HOST"),
@@ -20,21 +32,59 @@ DB_PARAMS = {
 FIGURES_DIR = "reports/figures/"
 os.makedirs(FIGURES_DIR, exist_ok=True)
 
-def fetch_data_from_db():
-    """Connects to PostgreSQL and fetches all required review data."""
+# Ordered sentiment categories shared by all plots
+SENTIMENT_DTYPE = pd.CategoricalDtype(['Negative', 'Neutral', 'Positive'], ordered=True)
+
+# Local cache of the fetched analytics data, invalidated whenever load_db commits a new load
+# (load_db touches DB_LOAD_SENTINEL after each successful commit)
+DB_LOAD_SENTINEL = "data/.db_loaded"
+CACHE_DIR = "data"
+
+def _cache_file() -> str:
+    """Returns the cache path for the configured database, so each host/database/user gets its own cache."""
+    identity = f"{DB_PARAMS['user']}@{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['database']}"
+    digest = hashlib.sha1(identity.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"analytics_cache_{digest}.parquet")
+
+def _cache_is_fresh() -> bool:
+    """Returns True if this database's Parquet cache exists and is newer than the last committed database load."""
+    cache_file = _cache_file()
+    if not os.path.exists(cache_file) or not os.path.exists(DB_LOAD_SENTINEL):
+        return False
+    return os.path.getmtime(cache_file) >= os.path.getmtime(DB_LOAD_SENTINEL)
+
+def fetch_data_from_db(refresh: bool = False):
+    """Connects to PostgreSQL and fetches all required review data, reusing the local cache when fresh."""
+    if not refresh and _cache_is_fresh():
+        cache_file = _cache_file()
+        print(f"Loading analyzed data from cache '{cache_file}'...")
+        df = pd.read_parquet(cache_file)
+        print(f"Successfully loaded {len(df)} cached records.")
+        return df
+    
     print("Connecting to database and fetching analyzed data...")
     conn = None
     try:
         conn = psycopg2.connect(**DB_PARAMS)
         
         sql_query = """
-        SELECT b.bank_name, r.review_text, r.rating, r.review_date, r.compound_score, r.sentiment, r.theme
-        FROM reviews r JOIN banks b ON r.bank_id = b.bank_id;
+        SELECT b.bank_name, r.rating, r.review_date, r.compound_score, r.sentiment, r.theme
+        FROM reviews r JOIN banks b ON r.bank_id = b.bank_id
         """
         
-        df = pd.read_sql(sql_query, conn)
-        df['review_date'] = pd.to_datetime(df['review_date'])
+        # Stream the result set as CSV via COPY instead of building Python tuples per row
+        buf = io.BytesIO()
+        with conn.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({sql_query}) TO STDOUT WITH (FORMAT CSV, HEADER)", buf)
+        buf.seek(0)
+        
+        df = pd.read_csv(buf, parse_dates=['review_date'])
         print(f"Successfully fetched {len(df)} records.")
+        
+        # An empty result is never cached, so the next run queries the database again
+        if not df.empty:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df.to_parquet(_cache_file(), index=False)
         return df
 
     except psycopg2.Error as e:
@@ -44,67 +94,102 @@ def fetch_data_from_db():
         if conn:
             conn.close()
 
+def prepare_data(df):
+    """Converts columns in place to the dtypes and derived keys the plots group on."""
+    # Low-cardinality string columns become categoricals so groupbys work on integer codes
+    df['bank_name'] = df['bank_name'].astype('category')
+    df['theme'] = df['theme'].astype('category')
+    df['sentiment'] = df['sentiment'].astype(SENTIMENT_DTYPE)
+    
+    # Month and day buckets, computed once as datetime64 casts instead of per-plot .dt calls
+    review_dates = df['review_date'].to_numpy()
+    df['_ym'] = review_dates.astype('datetime64[M]')
+    df['_day'] = review_dates.astype('datetime64[D]')
+
+SUBPLOT_PARAMS = ('left', 'right', 'bottom', 'top', 'wspace', 'hspace')
+
+def new_axes(fig, figsize):
+    """Resizes the shared figure, resets its layout and adds a fresh set of axes to it."""
+    fig.set_size_inches(figsize)
+    # fig.clear() keeps subplot params, e.g. pandas' date-axis subplots_adjust(bottom=0.2),
+    # so restore the rc defaults to keep every plot independent of what was drawn before it
+    fig.subplots_adjust(**{k: matplotlib.rcParams[f'figure.subplot.{k}'] for k in SUBPLOT_PARAMS})
+    return fig.add_subplot()
+
 def save_plot(fig, filename):
-    """Saves the figure and closes it."""
+    """Saves the figure and clears it so the canvas can be reused for the next plot."""
     filepath = os.path.join(FIGURES_DIR, filename)
-    fig.savefig(filepath, bbox_inches='tight')
-    plt.close(fig)
+    fig.savefig(filepath, dpi=100, bbox_inches='tight')
+    fig.clear()
 
-def generate_all_plots(df):
-    """Generates and saves all 10 required plots."""
-    print("\nStarting the generation of 10 Visualizations...")
+def compute_bank_summaries(df):
+    """Computes the per-bank rating stats and sentiment percentages shared by the plots and metrics."""
+    g = df.groupby('bank_name', sort=False, observed=True)
+    bank_stats = g.agg(avg_rating=('rating', 'mean'), total=('rating', 'size'))
+    
+    sent_pct = df.groupby(['bank_name', 'sentiment'], sort=False, observed=True).size().unstack(fill_value=0)
+    sent_pct = sent_pct.div(sent_pct.sum(axis=1), axis=0).mul(100)
+    return bank_stats, sent_pct
 
-    # Plot 1: Overall Sentiment Distribution (Pie Chart)
-    fig1, ax1 = plt.subplots(figsize=(7, 7))
+def _plot_1(fig, df, bank_stats, sent_pct):
+    """Draws Plot 1: Overall Sentiment Distribution (Pie Chart) onto the figure and returns its filename."""
+    ax1 = new_axes(fig, (7, 7))
     sentiment_counts = df['sentiment'].value_counts()
+    sentiment_counts = sentiment_counts[sentiment_counts > 0]
     ax1.pie(sentiment_counts, labels=sentiment_counts.index, autopct='%1.1f%%', startangle=90,
             colors=sns.color_palette('pastel', n_colors=len(sentiment_counts)))
     ax1.set_title('Plot 1: Overall Sentiment Distribution')
-    save_plot(fig1, 'plot1_overall_sentiment_pie.png')
+    return 'plot1_overall_sentiment_pie.png'
 
-    # Plot 2: Sentiment Distribution by Bank (Grouped Bar Chart)
-    fig2, ax2 = plt.subplots(figsize=(10, 6))
-    sentiment_counts_bank = df.groupby('bank_name')['sentiment'].value_counts(normalize=True).mul(100).rename('percentage').reset_index()
+def _plot_2(fig, df, bank_stats, sent_pct):
+    """Draws Plot 2: Sentiment Distribution by Bank (Grouped Bar Chart) onto the figure and returns its filename."""
+    ax2 = new_axes(fig, (10, 6))
+    sentiment_counts_bank = sent_pct.stack().rename('percentage').reset_index()
     sns.barplot(data=sentiment_counts_bank, x='bank_name', y='percentage', hue='sentiment', 
                 hue_order=['Positive', 'Neutral', 'Negative'], palette={'Positive': 'g', 'Neutral': 'y', 'Negative': 'r'}, ax=ax2)
     ax2.set_title('Plot 2: Sentiment Distribution by Bank')
     ax2.set_xlabel('Bank/App Name')
     ax2.set_ylabel('Percentage of Reviews')
-    save_plot(fig2, 'plot2_sentiment_by_bank_bar.png')
+    return 'plot2_sentiment_by_bank_bar.png'
 
-    # Plot 3: Average Rating by Bank
-    fig3, ax3 = plt.subplots(figsize=(8, 5))
-    avg_ratings = df.groupby('bank_name')['rating'].mean().sort_values(ascending=False)
-    sns.barplot(x=avg_ratings.index, y=avg_ratings.values, palette='viridis', ax=ax3)
+def _plot_3(fig, df, bank_stats, sent_pct):
+    """Draws Plot 3: Average Rating by Bank onto the figure and returns its filename."""
+    ax3 = new_axes(fig, (8, 5))
+    avg_ratings = bank_stats['avg_rating'].sort_values(ascending=False)
+    # Explicit order: a CategoricalIndex would otherwise be drawn in alphabetical category order
+    sns.barplot(x=avg_ratings.index, y=avg_ratings.values, order=avg_ratings.index, palette='viridis', ax=ax3)
     ax3.set_title('Plot 3: Average Rating by Bank')
     ax3.set_ylim(1, 5)
-    save_plot(fig3, 'plot3_avg_rating_by_bank.png')
+    return 'plot3_avg_rating_by_bank.png'
 
-    # Plot 4: Overall Rating Distribution (Histogram)
-    fig4, ax4 = plt.subplots(figsize=(8, 5))
+def _plot_4(fig, df, bank_stats, sent_pct):
+    """Draws Plot 4: Overall Rating Distribution (Histogram) onto the figure and returns its filename."""
+    ax4 = new_axes(fig, (8, 5))
     sns.histplot(df['rating'], bins=5, kde=False, ax=ax4, color='skyblue')
     ax4.set_title('Plot 4: Overall Rating Distribution')
-    save_plot(fig4, 'plot4_overall_rating_distribution.png')
-
-    # Plot 5: Top 4 Thematic Clusters by Bank
-    fig5, ax5 = plt.subplots(figsize=(12, 8))
-    theme_analysis = df.groupby(['bank_name', 'theme']).size().reset_index(name='count')
-    total_reviews_bank = df.groupby('bank_name').size().reset_index(name='total')
-    # Merge and calculate percentage using the corrected variable: total_reviews_bank
-    theme_analysis = pd.merge(theme_analysis, total_reviews_bank, on='bank_name')
+    return 'plot4_overall_rating_distribution.png'
+
+def _plot_5(fig, df, bank_stats, sent_pct):
+    """Draws Plot 5: Top 4 Thematic Clusters by Bank onto the figure and returns its filename."""
+    ax5 = new_axes(fig, (12, 8))
+    theme_analysis = df.groupby(['bank_name', 'theme'], sort=False, observed=True).size().reset_index(name='count')
+    # Join the precomputed per-bank totals and calculate percentage
+    theme_analysis = theme_analysis.join(bank_stats['total'], on='bank_name')
     theme_analysis['percentage'] = (theme_analysis['count'] / theme_analysis['total']) * 100 
     
-    theme_analysis['rank'] = theme_analysis.groupby('bank_name')['percentage'].rank(method='first', ascending=False)
+    theme_analysis['rank'] = theme_analysis.groupby('bank_name', observed=True)['percentage'].rank(method='first', ascending=False)
     top_themes_df = theme_analysis[theme_analysis['rank'] <= 4].sort_values(by=['bank_name', 'percentage'], ascending=[True, False])
-    sns.barplot(data=top_themes_df, x='bank_name', y='percentage', hue='theme', palette='Set2', ax=ax5)
+    # Legend follows the percentage ranking rather than alphabetical category order
+    theme_order = top_themes_df['theme'].drop_duplicates().tolist()
+    sns.barplot(data=top_themes_df, x='bank_name', y='percentage', hue='theme', hue_order=theme_order, palette='Set2', ax=ax5)
     ax5.set_title('Plot 5: Top 4 Thematic Clusters by Bank')
     ax5.legend(title='Top Theme', bbox_to_anchor=(1.05, 1), loc='upper left')
-    save_plot(fig5, 'plot5_top_themes_by_bank.png')
+    return 'plot5_top_themes_by_bank.png'
 
-    # Plot 6: Overall Sentiment Trend Over Time (Line Plot)
-    fig6, ax6 = plt.subplots(figsize=(12, 6))
-    df_monthly_sentiment = df.groupby([df['review_date'].dt.to_period('M'), 'sentiment']).size().unstack(fill_value=0)
-    df_monthly_sentiment.index = df_monthly_sentiment.index.to_timestamp()
+def _plot_6(fig, df, bank_stats, sent_pct):
+    """Draws Plot 6: Overall Sentiment Trend Over Time (Line Plot) onto the figure and returns its filename."""
+    ax6 = new_axes(fig, (12, 6))
+    df_monthly_sentiment = df.groupby(['_ym', 'sentiment'], observed=True).size().unstack(fill_value=0)
     
     color_map = {'Negative': 'r', 'Neutral': 'y', 'Positive': 'g'}
     plot_colors = [color_map.get(col, 'gray') for col in df_monthly_sentiment.columns] 
@@ -115,49 +200,98 @@ def generate_all_plots(df):
     ax6.set_xlabel('Date')
     ax6.set_ylabel('Number of Reviews')
     ax6.legend(title='Sentiment')
-    save_plot(fig6, 'plot6_overall_sentiment_trend.png')
+    return 'plot6_overall_sentiment_trend.png'
 
-    # Plot 7: Ratings Distribution by Bank (Box Plot)
-    fig7, ax7 = plt.subplots(figsize=(10, 6))
+def _plot_7(fig, df, bank_stats, sent_pct):
+    """Draws Plot 7: Ratings Distribution by Bank (Box Plot) onto the figure and returns its filename."""
+    ax7 = new_axes(fig, (10, 6))
     sns.boxplot(data=df, x='bank_name', y='rating', ax=ax7, palette='pastel')
     ax7.set_title('Plot 7: Ratings Distribution by Bank (Box Plot)')
-    save_plot(fig7, 'plot7_rating_distribution_boxplot.png')
+    return 'plot7_rating_distribution_boxplot.png'
 
-    # Plot 8: Top Themes in Negative Reviews for BOA
+def _plot_8(fig, df, bank_stats, sent_pct):
+    """Draws Plot 8: Top Themes in Negative Reviews for BOA, or returns None if there are none."""
     boa_df = df[df['bank_name'] == 'Bank of Abyssinia (BOA)']
-    negative_boa_themes = boa_df[boa_df['sentiment'] == 'Negative']['theme'].value_counts().head(5)
+    negative_boa_themes = boa_df[boa_df['sentiment'] == 'Negative']['theme'].value_counts()
+    negative_boa_themes = negative_boa_themes[negative_boa_themes > 0].head(5)
     if not negative_boa_themes.empty:
-        fig8, ax8 = plt.subplots(figsize=(8, 8))
+        ax8 = new_axes(fig, (8, 8))
         ax8.pie(negative_boa_themes, labels=negative_boa_themes.index, autopct='%1.1f%%', startangle=90,
                 colors=sns.color_palette('Reds', n_colors=len(negative_boa_themes)))
         ax8.set_title('Plot 8: Top Themes in Negative Reviews for BOA')
-        save_plot(fig8, 'plot8_boa_negative_themes_pie.png')
+        return 'plot8_boa_negative_themes_pie.png'
+    return None
 
-    # Plot 9: Distribution of Sentiment Scores by Bank (Violin Plot)
-    fig9, ax9 = plt.subplots(figsize=(10, 6))
+def _plot_9(fig, df, bank_stats, sent_pct):
+    """Draws Plot 9: Distribution of Sentiment Scores by Bank (Violin Plot) onto the figure and returns its filename."""
+    ax9 = new_axes(fig, (10, 6))
     sns.violinplot(data=df, x='bank_name', y='compound_score', palette='muted', ax=ax9)
     ax9.set_title('Plot 9: Distribution of Sentiment Scores by Bank')
     ax9.axhline(y=0.05, color='green', linestyle='--')
     ax9.axhline(y=-0.05, color='red', linestyle='--')
-    save_plot(fig9, 'plot9_sentiment_score_distribution.png')
+    return 'plot9_sentiment_score_distribution.png'
 
-    # Plot 10: 7-Day Rolling Average Rating Over Time (Line Plot)
-    df_daily_avg_rating = df.groupby(df['review_date'])['rating'].mean().rolling(window=7).mean().dropna()
-    fig10, ax10 = plt.subplots(figsize=(12, 6))
+def _plot_10(fig, df, bank_stats, sent_pct):
+    """Draws Plot 10: 7-Day Rolling Average Rating Over Time (Line Plot) onto the figure and returns its filename."""
+    df_daily_avg_rating = df.groupby('_day')['rating'].mean().rename_axis('review_date').rolling(window=7).mean().dropna()
+    ax10 = new_axes(fig, (12, 6))
     df_daily_avg_rating.plot(ax=ax10, color='purple')
     ax10.set_title('Plot 10: 7-Day Rolling Average Rating Over Time')
     ax10.grid(axis='y', linestyle='--')
-    save_plot(fig10, 'plot10_rolling_avg_rating_trend.png')
+    return 'plot10_rolling_avg_rating_trend.png'
+
+PLOTS = [_plot_1, _plot_2, _plot_3, _plot_4, _plot_5, _plot_6, _plot_7, _plot_8, _plot_9, _plot_10]
+
+# Per-process state for the plot workers, set once by _init_plot_worker
+_worker_state = {}
+
+def _init_plot_worker(data_path, bank_stats, sent_pct):
+    """Loads the shared plot inputs once per worker process and creates its reusable figure."""
+    _worker_state['args'] = (pd.read_parquet(data_path), bank_stats, sent_pct)
+    _worker_state['fig'] = plt.figure()
+
+def _render_plot(plot_fn):
+    """Draws one plot in a worker process and saves it; returns the filename or None if skipped."""
+    fig = _worker_state['fig']
+    filename = plot_fn(fig, *_worker_state['args'])
+    if filename:
+        save_plot(fig, filename)
+    else:
+        fig.clear()
+    return filename
+
+def generate_all_plots(df, bank_stats=None, sent_pct=None):
+    """Generates and saves all 10 required plots."""
+    print("\nStarting the generation of 10 Visualizations...")
+    # The plots need the dtypes and date buckets from prepare_data; apply it to a copy if the caller hasn't
+    if '_ym' not in df.columns or '_day' not in df.columns:
+        df = df.copy()
+        prepare_data(df)
+    if bank_stats is None or sent_pct is None:
+        bank_stats, sent_pct = compute_bank_summaries(df)
+
+    # Plots are independent and rasterization holds the GIL, so render them in separate processes.
+    # The data is written to Parquet once so workers don't each receive a pickled copy of df.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = os.path.join(tmp_dir, "plot_data.parquet")
+        df.to_parquet(data_path, index=False)
+        
+        max_workers = min(len(PLOTS), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_plot_worker,
+                                 initargs=(data_path, bank_stats, sent_pct)) as executor:
+            list(executor.map(_render_plot, PLOTS))
 
     print("\nAll 10 visualizations have been successfully saved to 'reports/figures/'")
 
-def print_key_metrics(df):
+def print_key_metrics(df, bank_stats=None, sent_pct=None):
     """Calculates and prints essential metrics for the manual PDF report."""
+    if bank_stats is None or sent_pct is None:
+        bank_stats, sent_pct = compute_bank_summaries(df)
     
     # --- Metrics for Executive Summary ---
     total_reviews_count = len(df)
-    avg_ratings = df.groupby('bank_name')['rating'].mean().sort_values(ascending=False)
-    sentiment_dist = df.groupby('bank_name')['sentiment'].value_counts(normalize=True).mul(100).unstack(fill_value=0)
+    avg_ratings = bank_stats['avg_rating'].sort_values(ascending=False)
+    sentiment_dist = sent_pct
     
     bank_highest_avg_rating = avg_ratings.index[0]
     bank_highest_positive = sentiment_dist['Positive'].idxmax()
@@ -165,7 +299,8 @@ def print_key_metrics(df):
     
     # For BOA's most critical theme
     boa_df = df[df['bank_name'] == 'Bank of Abyssinia (BOA)']
-    boa_negative_themes = boa_df[boa_df['sentiment'] == 'Negative']['theme'].value_counts(normalize=True).mul(100)
+    boa_negative_themes = boa_df[boa_df['sentiment'] == 'Negative']['theme'].value_counts()
+    boa_negative_themes = boa_negative_themes[boa_negative_themes > 0]
     most_critical_boa_theme = boa_negative_themes.index[0] if not boa_negative_themes.empty else "N/A"
 
     print("\n--- Key Metrics for Final PDF Report ---")
@@ -177,23 +312,32 @@ def print_key_metrics(df):
     print("\n(Use the charts in 'reports/figures/' and these metrics to write the final PDF narrative.)")
 
 
-def run_task4_reporting():
+def run_task4_reporting(refresh: bool = False):
     """Main function for Task 4."""
     
-    if not all(DB_PARAMS.values()):
+    # Credentials are only needed when the data actually has to be fetched from the database
+    if (refresh or not _cache_is_fresh()) and not all(DB_PARAMS.values()):
         print("\nFatal Error: Database credentials are not correctly loaded from environment variables.")
         return
         
-    df = fetch_data_from_db()
+    df = fetch_data_from_db(refresh=refresh)
     
     if df.empty:
         print("\n⚠️ Report generation stopped. Data fetching failed.")
         return
 
-    generate_all_plots(df)
+    prepare_data(df)
+
+    bank_stats, sent_pct = compute_bank_summaries(df)
+
+    generate_all_plots(df, bank_stats, sent_pct)
     
-    print_key_metrics(df)
+    print_key_metrics(df, bank_stats, sent_pct)
 
 
 if __name__ == "__main__":
-    run_task4_reporting()
+    parser = argparse.ArgumentParser(description="Generate Task 4 plots and key metrics.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the local cache and re-fetch data from the database.")
+    args = parser.parse_args()
+    
+    run_task4_reporting(refresh=args.refresh)
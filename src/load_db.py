@@ -1,14 +1,17 @@
 import pandas as pd
 import psycopg2
-from psycopg2 import sql
+from psycopg2.extras import execute_values
 from typing import Dict
 from dotenv import load_dotenv  
 import os                     
+import io
 
 load_dotenv()
 
 # Configuration 
 INPUT_FILE = "data/analyzed_reviews.csv"
+# Touched after every committed load so insights_viz knows its local cache is stale
+DB_LOAD_SENTINEL = "data/.db_loaded"
 
 # DB_PARAMS now populated by environment variables
 DB_PARAMS: Dict[str, str] = {
@@ -38,8 +41,20 @@ CREATE TABLE IF NOT EXISTS reviews (
     review_date DATE NOT NULL,
     compound_score DECIMAL(5, 4),
     sentiment VARCHAR(10) NOT NULL,
-    theme VARCHAR(255)
+    theme VARCHAR(255),
+    play_review_id VARCHAR(100)
 );
+
+-- Tables created before the Play Store review ID was stored get the column added (NULL for existing rows)
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS play_review_id VARCHAR(100);
+
+-- 3. Index the join/filter columns and the Play Store review ID used to skip already stored reviews
+CREATE INDEX IF NOT EXISTS idx_reviews_bank_id ON reviews(bank_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_date ON reviews(review_date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_reviews_play_review_id ON reviews(play_review_id);
+
+-- 4. Reviews are loaded once and never updated, so pack heap pages fully
+ALTER TABLE reviews SET (fillfactor = 100);
 """
 
 def create_tables(cursor):
@@ -47,70 +62,98 @@ def create_tables(cursor):
     print("Executing schema creation script...")
     try:
         cursor.execute(SCHEMA_SQL)
-        print("Schema (banks and reviews tables) successfully created or already exists.")
+        print("Schema (banks and reviews tables, indexes) successfully created or already exists.")
     except psycopg2.Error as e:
         print(f"Database error during table creation: {e}")
         raise
 
-def insert_bank_if_not_exists(cursor, bank_name: str, app_source: str) -> int:
-    """Inserts a bank name into the banks table if it doesn't exist, and returns its ID."""
+def upsert_banks(cursor, df: pd.DataFrame) -> Dict[str, int]:
+    """Inserts every bank in the DataFrame in one statement and returns a bank name -> ID map."""
+    vals = list(df.drop_duplicates('Bank/App Name')[['Bank/App Name', 'Source']].itertuples(index=False, name=None))
+    
+    # DO UPDATE (rather than DO NOTHING) so RETURNING also yields rows for banks that already exist
+    upsert_query = """
+        INSERT INTO banks (bank_name, app_source) VALUES %s
+        ON CONFLICT (bank_name) DO UPDATE SET bank_name = EXCLUDED.bank_name
+        RETURNING bank_id, bank_name
+    """
     try:
-        cursor.execute(
-            sql.SQL("SELECT bank_id FROM banks WHERE bank_name = %s"),
-            [bank_name]
-        )
-        result = cursor.fetchone()
-        
-        if result:
-            return result[0]
-        
-        cursor.execute(
-            sql.SQL("INSERT INTO banks (bank_name, app_source) VALUES (%s, %s) RETURNING bank_id"),
-            [bank_name, app_source]
-        )
-        return cursor.fetchone()[0]
+        rows = execute_values(cursor, upsert_query, vals, fetch=True)
+        return {bank_name: bank_id for bank_id, bank_name in rows}
     
     except psycopg2.Error as e:
         print(f"Database error during bank insertion: {e}")
         raise
 
-def insert_reviews(cursor, df: pd.DataFrame):
-    """Inserts all reviews into the reviews table."""
+def insert_reviews(cursor, df: pd.DataFrame) -> int:
+    """Inserts all reviews into the reviews table and returns the number of newly inserted rows."""
     print(f"Starting insertion of {len(df)} reviews...")
     
-    bank_id_map = {}
-    
-    for bank in df['Bank/App Name'].unique():
-        bank_id = insert_bank_if_not_exists(cursor, bank, df['Source'].iloc[0]) 
-        bank_id_map[bank] = bank_id
-
-    records = []
-    for index, row in df.iterrows():
-        bank_id = bank_id_map.get(row['Bank/App Name'])
-        
-        # NOTE: Explicitly casting values to ensure correct type for SQL insertion
-        records.append((
-            bank_id,
-            row['Review Text'],
-            int(row['Rating']),
-            row['Date'],
-            float(row['Compound Score']),
-            row['Sentiment'],
-            row['Theme']
-        ))
-
-    insert_query = sql.SQL("""
-        INSERT INTO reviews (bank_id, review_text, rating, review_date, compound_score, sentiment, theme)
-        VALUES ({})
-    """).format(sql.SQL(', ').join(sql.Placeholder() * 7))
+    bank_id_map = upsert_banks(cursor, df)
+
+    # NOTE: Casting once up front so the CSV carries the correct types for SQL insertion
+    typed_df = df.astype({'Rating': 'int32', 'Compound Score': 'float64'})
+    buf = io.StringIO()
+    typed_df.assign(bank_id=typed_df['Bank/App Name'].map(bank_id_map))[
+        ['bank_id', 'Review Text', 'Rating', 'Date', 'Compound Score', 'Sentiment', 'Theme', 'Review ID']
+    ].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+
+    columns = "bank_id, review_text, rating, review_date, compound_score, sentiment, theme, play_review_id"
+
+    # Scratch table with the same column types as reviews (no constraints or defaults), dropped at commit
+    stage_query = f"""
+        CREATE TEMP TABLE reviews_stage ON COMMIT DROP AS
+        SELECT {columns} FROM reviews WITH NO DATA
+    """
+
+    # Rows stored before play_review_id existed are kept; only those this batch re-delivers are
+    # replaced, so they are not stored twice (once without and once with their review ID)
+    legacy_query = """
+        DELETE FROM reviews r USING reviews_stage s
+        WHERE r.play_review_id IS NULL
+          AND r.bank_id = s.bank_id
+          AND r.review_date = s.review_date
+          AND r.review_text = s.review_text
+    """
+
+    insert_query = f"""
+        INSERT INTO reviews ({columns})
+        SELECT {columns} FROM reviews_stage
+        ON CONFLICT (play_review_id) DO NOTHING
+    """
 
     try:
-        cursor.executemany(insert_query, records)
-        print(f"Successfully inserted {cursor.rowcount} review records.")
+        # COPY into the staging table, then merge into reviews in one statement
+        cursor.execute(stage_query)
+        cursor.copy_expert(f"COPY reviews_stage ({columns}) FROM STDIN WITH (FORMAT CSV)", buf)
+        cursor.execute(legacy_query)
+        if cursor.rowcount:
+            print(f"Replacing {cursor.rowcount} previously stored review records that had no Play Store review ID.")
+        cursor.execute(insert_query)
+        inserted = cursor.rowcount
+        print(f"Successfully inserted {inserted} review records ({len(df) - inserted} already stored).")
+        return inserted
     except psycopg2.Error as e:
         print(f"Database error during review bulk insertion: {e}")
         raise
 
+def cluster_reviews(cursor):
+    """Physically orders the reviews table by bank and refreshes planner statistics."""
+    print("Clustering reviews by bank and analyzing table...")
+    try:
+        cursor.execute("CLUSTER reviews USING idx_reviews_bank_id;")
+        cursor.execute("ANALYZE reviews;")
+    except psycopg2.Error as e:
+        print(f"Database error during review clustering: {e}")
+        raise
+
+def mark_db_loaded():
+    """Updates the load sentinel's mtime so cached analytics data fetched before this load is refetched."""
+    os.makedirs(os.path.dirname(DB_LOAD_SENTINEL), exist_ok=True)
+    with open(DB_LOAD_SENTINEL, 'a'):
+        os.utime(DB_LOAD_SENTINEL, None)
+
 def ingestion():
     """Main function to handle database connection, table creation, and data ingestion."""
     conn = None
@@ -124,6 +167,9 @@ def ingestion():
         # Load Data
         df = pd.read_csv(INPUT_FILE)
         df = df.dropna(subset=['Review Text'])
+        if 'Review ID' not in df.columns:
+            print(f"Error: '{INPUT_FILE}' has no 'Review ID' column. Re-run Task 1 preprocessing and Task 2 analysis to regenerate it.")
+            return
         
         # Connect to DB
         print(f"Attempting to connect to PostgreSQL database: {DB_PARAMS['database']}...")
@@ -131,15 +177,23 @@ def ingestion():
         conn.autocommit = False 
         cursor = conn.cursor()
         
+        # One-shot reload: skip the WAL fsync at commit and give the merge more sort memory
+        cursor.execute("SET LOCAL synchronous_commit = OFF;")
+        cursor.execute("SET LOCAL work_mem = '64MB';")
+        
         # Create Tables
         create_tables(cursor)
 
         # Ingest Data
-        insert_reviews(cursor, df)
+        inserted = insert_reviews(cursor, df)
+        # CLUSTER rewrites the table and its indexes under an exclusive lock; skip it when nothing changed
+        if inserted > 0:
+            cluster_reviews(cursor)
         
         # Commit and Close
         conn.commit()
         print("\n Data successfully stored and transaction committed.")
+        mark_db_loaded()
         
     except FileNotFoundError:
         print(f"Error: Input file '{INPUT_FILE}' not found. Ensure Task 2 was run correctly.")
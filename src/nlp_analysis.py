@@ -3,9 +3,11 @@ import nltk
 import re
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import NMF
+from sklearn.decomposition import MiniBatchNMF
+from joblib import Parallel, delayed, parallel_backend
 from nltk.corpus import stopwords
 import numpy as np
+from numba import njit
 
 # Configuration 
 INPUT_FILE = "data/processed_data.csv"
@@ -15,24 +17,15 @@ N_THEMES = 4 # Targeting 4 themes per bank (within the 3-5 requirement)
 ENGLISH_STOP_WORDS = stopwords.words('english')
 
 
-def clean_text(text):
-    """Basic cleaning for text: remove punctuation, lowercase, remove stopwords."""
-    if not isinstance(text, str):
-        return ""
-    text = text.lower()
-    text = re.sub(r'[^a-z\s]', '', text) 
-    tokens = text.split()
-    tokens = [word for word in tokens if word not in ENGLISH_STOP_WORDS and len(word) > 2]
-    return " ".join(tokens)
+# Single alternation of all stopwords plus any 1-2 letter token, compiled once
+STOP_WORDS_PATTERN = re.compile(r'\b(?:' + '|'.join(map(re.escape, ENGLISH_STOP_WORDS)) + r'|\w{1,2})\b')
 
-def get_sentiment(compound_score):
-    """Classifies sentiment based on VADER compound score."""
-    if compound_score >= 0.05:
-        return 'Positive'
-    elif compound_score <= -0.05:
-        return 'Negative'
-    else:
-        return 'Neutral'
+
+def clean_text(texts: pd.Series) -> pd.Series:
+    """Basic cleaning for a text column: remove punctuation, lowercase, remove stopwords."""
+    cleaned = texts.astype(str).str.lower().str.replace(r'[^a-z\s]', '', regex=True)
+    cleaned = cleaned.str.replace(STOP_WORDS_PATTERN, '', regex=True)
+    return cleaned.str.replace(r'\s+', ' ', regex=True).str.strip()
 
 def get_theme_map(model, feature_names, n_top_words=5):
     """Generates a theme name for each topic based on its top 3 words."""
@@ -46,6 +39,53 @@ def get_theme_map(model, feature_names, n_top_words=5):
         
     return theme_map
 
+@njit(cache=True)
+def assign_themes(W):
+    """Returns the index of the dominant topic for each row of the NMF weight matrix."""
+    n, k = W.shape
+    out = np.empty(n, dtype=np.int8)
+    for i in range(n):
+        best = 0
+        bv = W[i, 0]
+        for j in range(1, k):
+            v = W[i, j]
+            if v > bv:
+                bv = v
+                best = j
+        out[i] = best
+    return out
+
+def _analyze_bank(bank, bank_df, dtm, feature_names):
+    """Fits NMF on one bank's slice of the TF-IDF matrix and returns its reviews with a 'Theme' column."""
+    print(f"\n-> Analyzing themes for: {bank}")
+    
+    if dtm.nnz == 0:
+        print(f"   Skipping NMF for {bank}: Not enough unique documents/terms.")
+        bank_df['Theme'] = 'General/Not Enough Data'
+        return bank_df
+    
+    # Topic Modeling (Mini-batch NMF converges in far fewer passes than full NMF)
+    nmf = MiniBatchNMF(n_components=N_THEMES, batch_size=128, random_state=42, max_iter=100)
+    nmf.fit(dtm)
+    topic_weights = nmf.transform(dtm)
+    
+    # Theme Assignment
+    theme_map = get_theme_map(nmf, feature_names)
+    
+    print("   Identified Themes (Top 3 Keywords):")
+    for idx, name in theme_map.items():
+        print(f"   Theme {idx+1}: {name}")
+        
+    # Assign the dominant topic index and map to theme name
+    # (different topics can share a name, so categories are de-duplicated before building codes)
+    idx = assign_themes(topic_weights)
+    names = [theme_map[j] for j in range(N_THEMES)]
+    categories = list(dict.fromkeys(names))
+    topic_codes = np.array([categories.index(name) for name in names], dtype=np.int8)
+    bank_df['Theme'] = pd.Categorical.from_codes(topic_codes[idx], categories=categories)
+    
+    return bank_df
+
 def run_task2_analysis():
     """Performs Sentiment and Thematic Analysis on review data."""
     print("Starting Task 2: Sentiment and Thematic Analysis...")
@@ -61,51 +101,39 @@ def run_task2_analysis():
     # Sentiment Analysis (VADER) 
     print("\n1. Performing Sentiment Analysis (VADER)...")
     analyzer = SentimentIntensityAnalyzer()
-    df['Compound Score'] = df['Review Text'].apply(lambda x: analyzer.polarity_scores(x)['compound'])
-    df['Sentiment'] = df['Compound Score'].apply(get_sentiment)
+    texts = df['Review Text'].to_numpy()
+    ps = analyzer.polarity_scores
+    df['Compound Score'] = np.fromiter((ps(t)['compound'] for t in texts), dtype=np.float64, count=len(texts))
+    # Classify sentiment based on VADER compound score
+    cs = df['Compound Score'].to_numpy()
+    df['Sentiment'] = np.select([cs >= 0.05, cs <= -0.05], ['Positive', 'Negative'], default='Neutral')
     
     #  Thematic Analysis (TF-IDF + NMF) 
     print("\n2. Performing Thematic Analysis (TF-IDF + NMF) per bank...")
     
     # Create a cleaned text column for NLP
-    df['Cleaned Text'] = df['Review Text'].apply(clean_text)
-    
-    analyzed_data = []
+    df['Cleaned Text'] = clean_text(df['Review Text'])
     
-    for bank in df['Bank/App Name'].unique():
-        print(f"\n-> Analyzing themes for: {bank}")
-        bank_df = df[df['Bank/App Name'] == bank].copy()
-        
-        # Vectorization (TF-IDF)
-        # Using 1-gram and 2-grams (single words and pairs)
-        vectorizer = TfidfVectorizer(max_df=0.85, min_df=5, ngram_range=(1, 2))
-        try:
-            dtm = vectorizer.fit_transform(bank_df['Cleaned Text'])
-            feature_names = vectorizer.get_feature_names_out()
-        except ValueError:
-            print(f"   Skipping NMF for {bank}: Not enough unique documents/terms.")
-            bank_df['Theme'] = 'General/Not Enough Data'
-            analyzed_data.append(bank_df)
-            continue
-        
-        # Topic Modeling (NMF)
-        nmf = NMF(n_components=N_THEMES, random_state=42, max_iter=300)
-        nmf.fit(dtm)
-        topic_weights = nmf.transform(dtm)
-        
-        # Theme Assignment
-        theme_map = get_theme_map(nmf, feature_names)
-        
-        print("   Identified Themes (Top 3 Keywords):")
-        for idx, name in theme_map.items():
-            print(f"   Theme {idx+1}: {name}")
-            
-        # Assign the dominant topic index and map to theme name
-        bank_df['Theme_Index'] = np.argmax(topic_weights, axis=1)
-        bank_df['Theme'] = bank_df['Theme_Index'].map(theme_map)
-        bank_df.drop('Theme_Index', axis=1, inplace=True)
+    # Vectorization (TF-IDF), fitted once on the whole corpus and sliced per bank
+    # Using 1-gram and 2-grams (single words and pairs)
+    vectorizer = TfidfVectorizer(max_df=0.85, min_df=5, ngram_range=(1, 2))
+    try:
+        dtm_all = vectorizer.fit_transform(df['Cleaned Text'])
+        feature_names = vectorizer.get_feature_names_out()
+    except ValueError:
+        print("   Skipping NMF: Not enough unique documents/terms.")
+        df['Theme'] = 'General/Not Enough Data'
+        analyzed_data = [df]
+    else:
+        bank_masks = {bank: (df['Bank/App Name'] == bank).to_numpy() for bank in df['Bank/App Name'].unique()}
         
-        analyzed_data.append(bank_df)
+        # Each bank's NMF fit is independent, so run them in separate processes.
+        # BLAS is pinned to one thread per worker to avoid oversubscribing the cores.
+        with parallel_backend('loky', inner_max_num_threads=1):
+            analyzed_data = Parallel(n_jobs=-1)(
+                delayed(_analyze_bank)(bank, df[mask].copy(), dtm_all[mask], feature_names)
+                for bank, mask in bank_masks.items()
+            )
     
     # Combine results and save
     final_df = pd.concat(analyzed_data, ignore_index=True)
@@ -1,21 +1,35 @@
-import pandas as pd
-import json
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import orjson
 
 # Configuration 
 INPUT_PATH = "data/raw_reviews.json"
 OUTPUT_PATH = "data/processed_data.csv"
 
+# Raw scraper fields to keep, and the column names they are saved under
+RAW_SCHEMA = pa.schema([
+    ('content', pa.string()),
+    ('score', pa.int64()),
+    ('at', pa.string()),
+    ('bank_name', pa.string()),
+    ('source', pa.string()),
+    ('reviewId', pa.string()),
+])
+OUTPUT_COLUMNS = ['Review Text', 'Rating', 'Date', 'Bank/App Name', 'Source', 'Review ID']
+
 # Data Preprocessing 
 def preprocess_data(input_path: str, output_path: str):
     """Loads raw JSON data, cleans it, and saves the final CSV."""
     
     print(f"Loading raw data from {input_path}...")
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
+        with open(input_path, 'rb') as f:
+            raw_data = orjson.loads(f.read())
         
-        df = pd.DataFrame(raw_data)
-        initial_count = len(df)
+        # Only the required fields are converted, straight into columnar Arrow storage
+        tbl = pa.Table.from_pylist(raw_data, schema=RAW_SCHEMA).rename_columns(OUTPUT_COLUMNS)
+        initial_count = tbl.num_rows
         print(f"Raw row count: {initial_count}")
         
     except FileNotFoundError:
@@ -27,32 +41,31 @@ def preprocess_data(input_path: str, output_path: str):
 
     print("Starting data preprocessing...")
     
-    df_clean = df[['content', 'score', 'at', 'bank_name', 'source']].copy()
-    df_clean.rename(columns={
-        'content': 'Review Text',
-        'score': 'Rating',
-        'at': 'Date',
-        'bank_name': 'Bank/App Name',
-        'source': 'Source'
-    }, inplace=True)
-    
-    df_clean.dropna(subset=['Review Text'], inplace=True)
+    tbl = tbl.filter(pc.is_valid(tbl['Review Text']))
     
-   
-    df_clean.drop_duplicates(subset=['Review Text', 'Date'], inplace=True)
+    # Keep the first occurrence of each (Review Text, Date) pair, in original order
+    keys = pa.table({
+        'Review Text': tbl['Review Text'],
+        'Date': tbl['Date'],
+        '_idx': pa.array(range(tbl.num_rows), pa.int64()),
+    })
+    first_idx = keys.group_by(['Review Text', 'Date']).aggregate([('_idx', 'min')])['_idx_min']
+    tbl = tbl.take(pc.take(first_idx, pc.sort_indices(first_idx)))
     
- 
-    df_clean['Date'] = pd.to_datetime(df_clean['Date']).dt.date
+    # Normalize ISO timestamps to fixed-width dates
+    dates = pc.cast(pc.cast(tbl['Date'], pa.timestamp('us')), pa.date32())
+    tbl = tbl.set_column(tbl.schema.get_field_index('Date'), 'Date', dates)
     
     # 5. Save the cleaned data
-    final_count = len(df_clean)
-    df_clean.to_csv(output_path, index=False)
+    final_count = tbl.num_rows
+    pa_csv.write_csv(tbl, output_path)
     
     print(f"Final row count after cleaning: {final_count}")
     print(f"Removed {initial_count - final_count} rows due to missing data or duplicates.")
     print(f"\n Task 1 Preprocessing Complete. Cleaned data saved to {output_path}")
     print("\nData Summary:")
-    print(df_clean.groupby('Bank/App Name')['Review Text'].count())
+    summary = tbl.group_by('Bank/App Name').aggregate([('Review Text', 'count')])
+    print(summary.to_pandas().set_index('Bank/App Name')['Review Text_count'].sort_index())
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import json
 from google_play_scraper import Sort, reviews
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuration 
 APP_IDS = {
@@ -12,34 +13,45 @@ N_REVIEWS_TO_SCRAPE = 500
 OUTPUT_PATH = "data/raw_reviews.json"
 
 # Data Collection (Scraping) 
+def _scrape_one(bank_name: str, app_id: str, n_reviews: int) -> list:
+    """Scrapes reviews for a single app and tags each review with its bank name and source."""
+    print(f"Scraping {n_reviews} reviews for {bank_name} (ID: {app_id})...")
+    
+    result, _ = reviews(
+        app_id,
+        lang='en',
+        country='et',
+        sort=Sort.NEWEST,
+        count=n_reviews,
+        filter_score_with=None 
+    )
+    
+    # Add bank name and source to each review dictionary
+    for res in result:
+        res['bank_name'] = bank_name
+        res['source'] = 'Google Play Store'
+        
+    print(f"Successfully scraped {len(result)} reviews for {bank_name}.")
+    return result
+
 def scrape_reviews(app_ids: dict, n_reviews: int) -> list:
-    """Scrapes reviews for all defined apps and combines them into a list of dictionaries."""
+    """Scrapes reviews for all defined apps concurrently and combines them into a list of dictionaries."""
     all_reviews = []
     
     print("Starting review scraping...")
-    for bank_name, app_id in app_ids.items():
-        print(f"Scraping {n_reviews} reviews for {bank_name} (ID: {app_id})...")
+    # Scraping is network-bound, so one thread per app overlaps the HTTP round-trips
+    with ThreadPoolExecutor(max_workers=len(app_ids)) as executor:
+        futures = {
+            executor.submit(_scrape_one, bank_name, app_id, n_reviews): bank_name
+            for bank_name, app_id in app_ids.items()
+        }
         
-        try:
-            result, _ = reviews(
-                app_id,
-                lang='en',
-                country='et',
-                sort=Sort.NEWEST,
-                count=n_reviews,
-                filter_score_with=None 
-            )
-            
-            # Add bank name and source to each review dictionary
-            for res in result:
-                res['bank_name'] = bank_name
-                res['source'] = 'Google Play Store'
-                all_reviews.append(res)
-                
-            print(f"Successfully scraped {len(result)} reviews for {bank_name}.")
-            
-        except Exception as e:
-            print(f"Error scraping {bank_name}: {e}")
+        for future in as_completed(futures):
+            bank_name = futures[future]
+            try:
+                all_reviews.extend(future.result())
+            except Exception as e:
+                print(f"Error scraping {bank_name}: {e}")
             
     print(f"\nTotal raw reviews scraped: {len(all_reviews)}")
     return all_reviews